@@ -24,24 +24,30 @@
 
 import os
 import io
+import re
+import json
+import time
 import uuid
 import shutil
 import zipfile
+import tempfile
 import sqlite3
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Tuple, Dict, Any, Iterable, Iterator, BinaryIO, Union
 from io import BytesIO
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 from PIL import Image
 
-# Barcode decode dependencies (camera snapshot -> UPC/EAN)
-import numpy as np
-import cv2
-import zxingcpp
+# Barcode decode dependencies (numpy, zxingcpp) are imported on first scan, see decode_barcode_from_image_bytes().
 
 from streamlit_local_storage import LocalStorage
 
@@ -73,22 +79,118 @@ os.makedirs(USER_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(USER_DIR, "movies.db")
 POSTERS_DIR = os.path.join(USER_DIR, "posters")
+# Canonical copy of each distinct poster image, named by content hash; per-URL names are hard links to these.
+POSTER_BLOBS_DIR = os.path.join(POSTERS_DIR, ".by_hash")
+BACKUP_ZIP_PATH = os.path.join(USER_DIR, "movie_shelf_backup.zip")
+
+# Lookup responses are public catalogue data, so one cache is shared by every user.
+CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
 
 # ---------------------------
 # Database
 # ---------------------------
-def db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+# Rule: every statement on the shared connection runs under its lock. Only db() and tx() hand
+# the connection out, and both hold the lock for as long as the caller has it.
+@st.cache_resource(show_spinner=False)
+def _shared_conn(db_path: str) -> sqlite3.Connection:
+    """
+    One connection per user DB, reused across reruns (key = per-user path).
+    Every session of that user (e.g. two browser tabs) shares it: use db() / tx(), never this directly.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # busy_timeout only matters against other connections to the file (another process);
+    # this app's own sessions never contend on it, they queue on db_lock() instead.
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA cache_size=-20000;
+        PRAGMA busy_timeout=5000;
+        PRAGMA foreign_keys=ON;
+        """
+    )
     return conn
 
+@st.cache_resource(show_spinner=False)
+def db_lock(db_path: str) -> threading.RLock:
+    """Serializes all use of _shared_conn(db_path) across the threads (sessions) sharing it."""
+    return threading.RLock()
+
+@st.cache_resource(show_spinner=False)
+def _tx_state() -> threading.local:
+    """Per-thread tx() nesting depth (conn.in_transaction can't tell whose transaction is open)."""
+    return threading.local()
+
+@contextmanager
+def db() -> Iterator[sqlite3.Connection]:
+    """The user's connection, held under db_lock() for the whole block (reentrant, so tx() can nest)."""
+    with db_lock(DB_PATH):
+        yield _shared_conn(DB_PATH)
+
+@contextmanager
+def tx():
+    """Explicit write transaction (BEGIN IMMEDIATE ... COMMIT). Nested use in the same thread joins the outer one."""
+    state = _tx_state()
+    with db() as conn:
+        depth = getattr(state, "depth", 0)
+        state.depth = depth + 1
+        try:
+            if depth:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                # A reader that raced ahead of the lock may have cached rows from before the rollback.
+                clear_read_caches()
+                raise
+            conn.commit()
+        finally:
+            state.depth = depth
+
+@st.cache_resource(show_spinner=False)
+def fts5_available() -> bool:
+    """Whether this Python's SQLite was built with FTS5; without it, search falls back to LIKE."""
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+MOVIES_FTS_SCHEMA = """
+-- Title search index (external content: rows live in movies, triggers keep it in sync)
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    title, content='movies', content_rowid='id', tokenize='unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN
+    INSERT INTO movies_fts(rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN
+    INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE OF title ON movies BEGIN
+    INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO movies_fts(rowid, title) VALUES (new.id, new.title);
+END;
+"""
+
 def init_db():
     os.makedirs(POSTERS_DIR, exist_ok=True)
-    with db() as conn:
+    with db() as conn:  # executescript() commits whatever is open: never another session's tx()
+        _init_db(conn)
+
+def _init_db(conn: sqlite3.Connection):
+    # The index is only trustworthy while its sync triggers exist; rebuild it whenever they didn't.
+    had_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='movies_fts_ai'").fetchone()
+    with conn:
         conn.executescript(
             """
-            PRAGMA journal_mode=WAL;
-
             CREATE TABLE IF NOT EXISTS movies (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
@@ -120,17 +222,139 @@ def init_db():
                 FOREIGN KEY (list_id) REFERENCES lists(id) ON DELETE CASCADE,
                 FOREIGN KEY (movie_id) REFERENCES movies(id) ON DELETE CASCADE
             );
+
+            CREATE INDEX IF NOT EXISTS idx_movies_title_nocase ON movies(title COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_movies_year ON movies(year DESC, title COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_movies_created ON movies(created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_list_items_pos ON list_items(list_id, position);
+            -- The (list_id, movie_id) key can't serve per-movie lookups: Library list counts and delete cascades.
+            CREATE INDEX IF NOT EXISTS idx_list_items_movie ON list_items(movie_id);
             """
         )
+        if fts5_available():
+            conn.executescript(MOVIES_FTS_SCHEMA)
+            if not had_fts:
+                # First run on an existing library: index the rows that are already there.
+                conn.execute("INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')")
+        else:
+            # A library indexed elsewhere: its triggers would fail every write on a SQLite without FTS5.
+            for name in ("movies_fts_ai", "movies_fts_ad", "movies_fts_au"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+# ---------------------------
+# HTTP (pooled keep-alive session)
+# ---------------------------
+@st.cache_resource(show_spinner=False)
+def http_session() -> requests.Session:
+    """Shared session so repeat requests to the same host skip the TCP+TLS handshake."""
+    s = requests.Session()
+    # Retry connect errors and gateway hiccups with a short backoff; other statuses go straight back to the caller.
+    # Never read timeouts (read=0): those would multiply each caller's timeout by the attempt count.
+    retry = Retry(total=2, read=0, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+@st.cache_resource(show_spinner=False)
+def io_pool() -> ThreadPoolExecutor:
+    """
+    Shared worker threads for network I/O (posters, lookups). One pool for the process
+    caps how hard all sessions together can hit OMDb/UPCMDB, and avoids a thread spin-up per call.
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="io")
+
+# ---------------------------
+# Disk cache (API responses)
+# ---------------------------
+DISK_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds
+
+def disk_cache_path(kind: str, key: str) -> str:
+    safe_key = "".join(ch for ch in key if ch.isalnum() or ch in "-_")
+    return os.path.join(CACHE_DIR, kind, f"{safe_key}.json")
+
+def disk_cache_get(kind: str, key: str) -> Optional[Any]:
+    """Cached JSON for (kind, key), or None if missing, unreadable or older than 30 days."""
+    path = disk_cache_path(kind, key)
+    try:
+        if time.time() - os.stat(path).st_mtime > DISK_CACHE_MAX_AGE:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def disk_cache_put(kind: str, key: str, value: Any):
+    path = disk_cache_path(kind, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)  # readers never see a half-written file
+    except (OSError, TypeError, ValueError):
+        pass
 
 # ---------------------------
 # Poster caching (semi-low quality)
 # ---------------------------
 def safe_filename(url: str) -> str:
-    h = hashlib.sha256(url.encode("utf-8")).hexdigest()[:24]
+    h = hashlib.blake2b(url.encode("utf-8"), digest_size=12).hexdigest()
     return f"{h}.jpg"
 
-def download_poster(url: str) -> Optional[str]:
+MAX_POSTER_BYTES = 2_000_000  # real posters are a few hundred KB; anything bigger isn't worth buffering
+PASSTHROUGH_MAX_BYTES = 80_000  # small, already-thumbnail JPEGs (e.g. OMDb's _SX300) are kept as-is
+
+def fetch_limited(url: str, session: Optional[requests.Session] = None, limit: int = MAX_POSTER_BYTES) -> Optional[bytes]:
+    """Stream a response body, giving up (None) as soon as it exceeds `limit` bytes."""
+    with (session or http_session()).get(url, stream=True, timeout=(3, 15)) as r:
+        r.raise_for_status()
+        try:
+            if int(r.headers.get("Content-Length") or 0) > limit:
+                return None
+        except ValueError:
+            pass
+        buf = bytearray()
+        for chunk in r.iter_content(64 * 1024):
+            buf += chunk
+            if len(buf) > limit:
+                return None
+        return bytes(buf)
+
+def store_poster_bytes(data: bytes, path: str) -> str:
+    """
+    Put `data` at `path` as a hard link to its content-hash blob, so different URLs serving the
+    same image share one file. Both names appear via os.replace, never half-written.
+    """
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    blob = os.path.join(POSTER_BLOBS_DIR, f"{digest}.jpg")
+    tag = uuid.uuid4().hex
+    blob_part, part = f"{blob}.{tag}.part", f"{path}.{tag}.part"
+    try:
+        if not os.path.exists(blob):
+            os.makedirs(POSTER_BLOBS_DIR, exist_ok=True)
+            with open(blob_part, "wb") as f:
+                f.write(data)
+            os.replace(blob_part, blob)
+        try:
+            os.link(blob, part)
+        except OSError:
+            # No hard links here (e.g. some mounted/Windows filesystems): the per-URL file becomes the
+            # only copy, and a blob nothing links to is dropped rather than kept as a second one.
+            with open(part, "wb") as f:
+                f.write(data)
+            if os.stat(blob).st_nlink <= 1:
+                os.unlink(blob)
+        os.replace(part, path)
+        # Its key is the directory mtime, which coarse-timestamp filesystems may not bump; drop it explicitly.
+        _poster_names.clear()
+        return path
+    finally:
+        for p in (blob_part, part):
+            if os.path.exists(p):
+                os.unlink(p)
+
+def download_poster(url: str, session: Optional[requests.Session] = None) -> Optional[str]:
     """Download poster, resize, compress."""
     if not url or url.strip().lower() in {"n/a", "na", "none"}:
         return None
@@ -141,32 +365,107 @@ def download_poster(url: str) -> Optional[str]:
         return path
 
     try:
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-        img = Image.open(BytesIO(r.content)).convert("RGB")
+        data = fetch_limited(url, session=session)
+        if data is None:
+            return None
 
         target_width = 300
-        if img.width > target_width:
-            ratio = target_width / float(img.width)
-            target_height = int(img.height * ratio)
-            img = img.resize((target_width, target_height), Image.LANCZOS)
-
+        max_height = target_width * 2  # posters are ~2:3; anything taller is a strip, not a cover
+        img = Image.open(BytesIO(data))  # lazy: only the header has been parsed so far
         os.makedirs(POSTERS_DIR, exist_ok=True)
-        img.save(path, format="JPEG", quality=70, optimize=True)
-        return path
+        if (
+            img.format == "JPEG"
+            and img.mode in ("RGB", "L")
+            and img.width <= target_width * 1.25
+            and img.height <= max_height
+            and len(data) < PASSTHROUGH_MAX_BYTES
+        ):
+            # Decoding and re-encoding would only cost CPU and add a second round of JPEG loss.
+            return store_poster_bytes(data, path)
+
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below the requested size)
+        img.draft("RGB", (target_width, max_height))
+        img = img.convert("RGB")
+
+        if img.width > target_width or img.height > max_height:
+            ratio = min(target_width / float(img.width), max_height / float(img.height))
+            # reducing_gap: cheap box pre-shrink, then LANCZOS only over the last ~3x
+            img = img.resize(
+                (max(1, int(img.width * ratio)), max(1, int(img.height * ratio))), Image.LANCZOS, reducing_gap=3.0
+            )
+
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=70, optimize=True, progressive=True)
+        return store_poster_bytes(out.getvalue(), path)
     except Exception:
         return None
 
+@st.cache_resource(max_entries=2000, show_spinner=False)
+def load_poster(path: str) -> Optional[bytes]:
+    """
+    Poster bytes held in memory, so reruns don't stat + reopen every JPEG.
+    Filenames are per-URL hashes and files are never rewritten in place,
+    so a path's bytes never go stale (restore clears this cache).
+    Immutable bytes: shared via cache_resource instead of copied per hit.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _poster_names(posters_dir: str, mtime: int) -> frozenset:
+    with os.scandir(posters_dir) as it:
+        return frozenset(e.name for e in it if e.is_file())
+
+def poster_files() -> frozenset:
+    """Filenames present in POSTERS_DIR: one scandir per dir change instead of a stat per card."""
+    try:
+        mtime = os.stat(POSTERS_DIR).st_mtime_ns
+    except OSError:
+        return frozenset()
+    return _poster_names(POSTERS_DIR, mtime)
+
+def poster_for(poster_path: Optional[str], existing: frozenset) -> Optional[bytes]:
+    """Bytes for a row's poster, resolved by filename inside this user's POSTERS_DIR."""
+    name = os.path.basename(poster_path or "")
+    if not name or name not in existing:
+        return None
+    return load_poster(os.path.join(POSTERS_DIR, name))
+
+def download_posters_many(urls: List[str]) -> Dict[str, Optional[str]]:
+    """Download several posters concurrently on io_pool() over the pooled session. Returns {url: path}."""
+    unique = list(dict.fromkeys(u for u in urls if u))
+    if not unique:
+        return {}
+    # Resolve the cached session here: worker threads have no Streamlit script context.
+    session = http_session()
+    paths = io_pool().map(lambda u: download_poster(u, session=session), unique)
+    return dict(zip(unique, paths))
+
 # ---------------------------
 # Barcode decode (camera snapshot)
 # ---------------------------
+# Disc cases only carry retail codes; skipping the other symbologies saves most of the decode time.
+BARCODE_FORMATS = "EAN-13,UPC-A,EAN-8,UPC-E"
+BARCODE_MAX_SIDE = 1280
+
 def decode_barcode_from_image_bytes(img_bytes: bytes) -> Optional[str]:
-    """Decode UPC/EAN/etc from an image snapshot using zxing-cpp."""
+    """Decode UPC/EAN from an image snapshot using zxing-cpp."""
+    # Imported here so app start (and every session that never scans) skips loading the native decoder.
+    import numpy as np
+    import zxingcpp
+
     try:
-        img = Image.open(BytesIO(img_bytes)).convert("RGB")
-        arr = np.array(img)
-        bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
-        res = zxingcpp.read_barcode(bgr)
+        # zxing only looks at luminance; Pillow's "L" (BT.601 weights) replaces the RGB->BGR copy cv2 needed.
+        img = Image.open(BytesIO(img_bytes)).convert("L")
+        w, h = img.size
+        if max(w, h) > BARCODE_MAX_SIDE:
+            # Phone snapshots can be 12 MP; a centred UPC reads just as well at preview size.
+            ratio = BARCODE_MAX_SIDE / max(w, h)
+            img = img.resize((int(w * ratio), int(h * ratio)), Image.BILINEAR)
+        res = zxingcpp.read_barcode(np.asarray(img), formats=zxingcpp.barcode_formats_from_str(BARCODE_FORMATS))
         if getattr(res, "valid", False) and getattr(res, "text", None):
             return res.text.strip()
         return None
@@ -183,10 +482,15 @@ def normalize_code(code: str) -> str:
 def upcmdb_headers() -> Dict[str, str]:
     return {"x-api-key": UPCMDB_API_KEY} if UPCMDB_API_KEY else {}
 
-def upcmdb_get_json(path: str, params: Optional[dict] = None) -> Dict[str, Any]:
+def upcmdb_get_json(
+    path: str,
+    params: Optional[dict] = None,
+    timeout: float = 25,
+    session: Optional[requests.Session] = None,
+) -> Dict[str, Any]:
     url = f"{UPCMDB_BASE_URL}{path}"
     try:
-        r = requests.get(url, headers=upcmdb_headers(), params=params or {}, timeout=25)
+        r = (session or http_session()).get(url, headers=upcmdb_headers(), params=params or {}, timeout=timeout)
     except Exception as e:
         return {"_error": True, "status": "exception", "text": str(e)}
 
@@ -198,29 +502,64 @@ def upcmdb_get_json(path: str, params: Optional[dict] = None) -> Dict[str, Any]:
     except Exception:
         return {"_error": True, "status": r.status_code, "text": r.text[:500]}
 
-def upcmdb_lookup_code(code_digits: str) -> Dict[str, Any]:
+# A lookup that hasn't answered by now is not going to; don't hold the scan for 25 s.
+UPCMDB_LOOKUP_TIMEOUT = 8
+
+def upcmdb_candidate_paths(code_digits: str) -> List[str]:
     """
-    If 12 digits -> UPC lookup
-    If 13 digits -> EAN lookup
-    If EAN returns 404 and starts with 0 -> try UPC-12 fallback (drop leading 0)
+    Lookup endpoints that can resolve this code, in order of precedence.
+    12 digits -> UPC
+    13 digits -> EAN, then UPC-12 if it starts with 0 (drop leading 0)
     """
     if len(code_digits) == 12:
-        return upcmdb_get_json(f"/v1/lookup/{code_digits}")
-
+        return [f"/v1/lookup/{code_digits}"]
     if len(code_digits) == 13:
-        ean_resp = upcmdb_get_json(f"/v1/lookup/ean/{code_digits}")
+        paths = [f"/v1/lookup/ean/{code_digits}"]
+        if code_digits.startswith("0"):
+            paths.append(f"/v1/lookup/{code_digits[1:]}")
+        return paths
+    return []
 
-        if ean_resp.get("_error") and ean_resp.get("status") == 404 and code_digits.startswith("0"):
-            upc12 = code_digits[1:]
-            return upcmdb_get_json(f"/v1/lookup/{upc12}")
-
-        return ean_resp
+def upcmdb_lookup_code(code_digits: str) -> Dict[str, Any]:
+    """Query the candidate endpoints at once; answers are taken in precedence order (see _upcmdb_lookup_paths)."""
+    paths = upcmdb_candidate_paths(code_digits)
+    if not paths:
+        return {
+            "_error": True,
+            "status": 400,
+            "text": f"Barcode must be 12 (UPC) or 13 (EAN) digits. Got {len(code_digits)}.",
+        }
+
+    cached = disk_cache_get("upc", code_digits)
+    if cached is not None:
+        return {"_error": False, "data": cached}
+
+    resp = _upcmdb_lookup_paths(paths)
+    if not resp.get("_error"):
+        disk_cache_put("upc", code_digits, resp.get("data"))
+    return resp
+
+def _upcmdb_lookup_paths(paths: List[str]) -> Dict[str, Any]:
+    """
+    Requests go out concurrently, but the answer is chosen as the sequential fallback would:
+    an endpoint's answer (data or error) stands unless it is a 404, which falls through to the next.
+    """
+    if len(paths) == 1:
+        return upcmdb_get_json(paths[0], timeout=UPCMDB_LOOKUP_TIMEOUT)
 
-    return {
-        "_error": True,
-        "status": 400,
-        "text": f"Barcode must be 12 (UPC) or 13 (EAN) digits. Got {len(code_digits)}.",
-    }
+    session = http_session()  # resolve the cached session here, not inside the worker threads
+    pool = io_pool()
+    futures = [pool.submit(upcmdb_get_json, p, timeout=UPCMDB_LOOKUP_TIMEOUT, session=session) for p in paths]
+    try:
+        for fut in futures[:-1]:
+            resp = fut.result()
+            if not (resp.get("_error") and resp.get("status") == 404):
+                return resp
+        return futures[-1].result()
+    finally:
+        # A decided answer doesn't wait on the fallbacks; drop any that haven't started yet.
+        for fut in futures:
+            fut.cancel()
 
 def upcmdb_lookup_imdb(imdb_id: str) -> Dict[str, Any]:
     return upcmdb_get_json(f"/v1/lookup/imdb/{imdb_id}")
@@ -279,55 +618,109 @@ class MovieMeta:
     source: str = "omdb"
     source_id: Optional[str] = None
 
-def omdb_search(title: str) -> List[Tuple[str, str, str]]:
+# OMDb years look like "1999", "2010–", "2010-2014" or "N/A"; take the first four-digit run.
+_YEAR_RE = re.compile(r"(\d{4})")
+
+OMDB_MIN_QUERY = 3
+
+# OMDb answers are stable per query; reruns and the Add click reuse them instead of re-fetching.
+# The cached functions raise on transport/API errors (cache_data never stores an exception),
+# so a timeout or "Request limit reached!" is retried next time instead of sticking for the TTL.
+# Stable "nothing to list" answers, cached like results; anything else (bad key, request limit) is a failure.
+OMDB_EMPTY_SEARCH_ERRORS = {"Movie not found!", "Too many results."}
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_omdb_search(title: str) -> List[Tuple[str, str, str, str]]:
+    r = http_session().get(
+        "https://www.omdbapi.com/",
+        params={"apikey": OMDB_API_KEY, "s": title},
+        timeout=20,
+    )
+    data = r.json()
+    if data.get("Response") != "True":
+        if data.get("Error") in OMDB_EMPTY_SEARCH_ERRORS:
+            return []  # a real answer: worth caching
+        raise ValueError(data.get("Error") or "OMDb search failed")
+    out: List[Tuple[str, str, str, str]] = []
+    for item in data.get("Search", []):
+        out.append((item.get("Title", ""), item.get("Year", ""), item.get("imdbID", ""), item.get("Poster", "")))
+    return out
+
+def omdb_search(title: str) -> List[Tuple[str, str, str, str]]:
+    """(title, year, imdb_id, poster_url) per match."""
     if not OMDB_API_KEY:
         return []
     try:
-        r = requests.get(
+        return _cached_omdb_search(title)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _cached_omdb_get(imdb_id: str) -> MovieMeta:
+    data = disk_cache_get("omdb", imdb_id)
+    if data is None:
+        r = http_session().get(
             "https://www.omdbapi.com/",
-            params={"apikey": OMDB_API_KEY, "s": title},
+            params={"apikey": OMDB_API_KEY, "i": imdb_id, "plot": "short"},
             timeout=20,
         )
         data = r.json()
         if data.get("Response") != "True":
-            return []
-        out: List[Tuple[str, str, str]] = []
-        for item in data.get("Search", []):
-            out.append((item.get("Title", ""), item.get("Year", ""), item.get("imdbID", "")))
-        return out
-    except Exception:
-        return []
+            raise ValueError(data.get("Error") or "OMDb lookup failed")
+        disk_cache_put("omdb", imdb_id, data)
+    m = _YEAR_RE.search(str(data.get("Year") or ""))
+    year = int(m.group(1)) if m else None
+    return MovieMeta(
+        title=data.get("Title") or "",
+        year=year,
+        plot=data.get("Plot"),
+        poster_url=data.get("Poster"),
+        source_id=data.get("imdbID"),
+    )
 
 def omdb_get(imdb_id: str) -> Optional[MovieMeta]:
     if not OMDB_API_KEY or not imdb_id:
         return None
     try:
-        r = requests.get(
-            "https://www.omdbapi.com/",
-            params={"apikey": OMDB_API_KEY, "i": imdb_id, "plot": "short"},
-            timeout=20,
-        )
-        data = r.json()
-        if data.get("Response") != "True":
-            return None
-        year = None
-        try:
-            year = int(str(data.get("Year", "")).split("–")[0])
-        except Exception:
-            year = None
-        return MovieMeta(
-            title=data.get("Title") or "",
-            year=year,
-            plot=data.get("Plot"),
-            poster_url=data.get("Poster"),
-            source_id=data.get("imdbID"),
-        )
+        return _cached_omdb_get(imdb_id)
     except Exception:
         return None
 
 # ---------------------------
 # CRUD
 # ---------------------------
+MOVIE_INSERT_SQL = """
+    INSERT INTO movies (title, year, plot, poster_url, poster_path, format, watched, location, notes, source, source_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def movie_insert_params(
+    title: str,
+    year: Optional[int],
+    plot: Optional[str],
+    poster_url: Optional[str],
+    poster_path: Optional[str],
+    fmt: str,
+    watched: bool,
+    location: Optional[str],
+    notes: Optional[str],
+    source: Optional[str] = None,
+    source_id: Optional[str] = None,
+) -> tuple:
+    return (
+        title.strip(),
+        year,
+        (plot or "").strip() or None,
+        (poster_url or "").strip() or None,
+        poster_path,
+        fmt,
+        1 if watched else 0,
+        (location or "").strip() or None,
+        (notes or "").strip() or None,
+        source,
+        source_id,
+    )
+
 def add_movie(
     title: str,
     year: Optional[int],
@@ -341,49 +734,156 @@ def add_movie(
     source_id: Optional[str] = None,
 ) -> int:
     poster_path = download_poster(poster_url or "") if poster_url else None
-    with db() as conn:
+    with tx() as conn:
         cur = conn.execute(
-            """
-            INSERT INTO movies (title, year, plot, poster_url, poster_path, format, watched, location, notes, source, source_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                title.strip(),
-                year,
-                (plot or "").strip() or None,
-                (poster_url or "").strip() or None,
-                poster_path,
-                fmt,
-                1 if watched else 0,
-                (location or "").strip() or None,
-                (notes or "").strip() or None,
-                source,
-                source_id,
+            MOVIE_INSERT_SQL,
+            movie_insert_params(
+                title, year, plot, poster_url, poster_path, fmt, watched, location, notes, source, source_id
             ),
         )
-        return int(cur.lastrowid)
-
-def get_movies(q: str = "", sort: str = "title_asc") -> List[sqlite3.Row]:
-    where = ""
-    params: List[str] = []
-    if q.strip():
-        where = "WHERE title LIKE ?"
-        params.append(f"%{q.strip()}%")
-
-    order = "ORDER BY title COLLATE NOCASE ASC"
-    if sort == "year_desc":
-        order = "ORDER BY COALESCE(year, 0) DESC, title COLLATE NOCASE ASC"
-    elif sort == "added_desc":
-        order = "ORDER BY datetime(created_at) DESC"
-    elif sort == "title_desc":
-        order = "ORDER BY title COLLATE NOCASE DESC"
+    clear_read_caches()
+    return int(cur.lastrowid)
+
+def bulk_add_movies(rows: Iterable[Dict[str, Any]], chunk_size: int = 10_000) -> int:
+    """
+    Insert many movies in a single transaction (executemany per chunk).
+    Each row uses add_movie's keyword names. Posters are fetched concurrently
+    before the write transaction opens, so the DB is never locked on network I/O.
+    """
+    rows = [r for r in rows if (r.get("title") or "").strip()]
+    if not rows:
+        return 0
+
+    posters = download_posters_many([(r.get("poster_url") or "").strip() for r in rows])
+    params = [
+        movie_insert_params(
+            title=r["title"],
+            year=r.get("year"),
+            plot=r.get("plot"),
+            poster_url=r.get("poster_url"),
+            poster_path=posters.get((r.get("poster_url") or "").strip()),
+            fmt=r.get("fmt") or "Blu-ray",
+            watched=bool(r.get("watched")),
+            location=r.get("location"),
+            notes=r.get("notes"),
+            source=r.get("source"),
+            source_id=r.get("source_id"),
+        )
+        for r in rows
+    ]
+
+    with tx() as conn:
+        for i in range(0, len(params), chunk_size):
+            conn.executemany(MOVIE_INSERT_SQL, params[i : i + chunk_size])
+    clear_read_caches()
+    return len(params)
+
+def fts_query(q: str) -> str:
+    """Free text -> FTS5 query: every word quoted (so punctuation is literal) and prefix-matched."""
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in q.split())
+
+def search_param(q: str) -> str:
+    """The bound value for MOVIE_SEARCH_WHERE: an FTS5 query, or a LIKE pattern on the fallback path."""
+    if fts5_available():
+        return fts_query(q)
+    return "%" + re.sub(r"([\\%_])", r"\\\1", q.strip()) + "%"
+
+def db_mtime() -> int:
+    """Newest mtime of movies.db or its WAL; any committed write bumps it."""
+    newest = 0
+    for p in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            newest = max(newest, os.stat(p).st_mtime_ns)
+        except OSError:
+            pass
+    return newest
+
+def clear_read_caches():
+    _cached_movies.clear()
+    _cached_movie_count.clear()
+    _cached_movie.clear()
+    _cached_lists.clear()
+    _cached_list_items.clear()
+
+# Keys carry the search text, page and db_mtime(); cap them so every typed query doesn't linger for the full TTL.
+READ_CACHE_ENTRIES = 64
+
+# list_count rides along in the page query (an index probe per row), so cards need no second round-trip.
+MOVIE_SUMMARY_COLUMNS = (
+    "id, title, year, format, watched, poster_path, "
+    "(SELECT COUNT(*) FROM list_items li WHERE li.movie_id = movies.id) AS list_count"
+)
+LIBRARY_PAGE_SIZE = 60
+
+# Library sort choices, label per key; the selectbox returns the key directly.
+SORT_LABELS = {
+    "title_asc": "Title A→Z",
+    "title_desc": "Title Z→A",
+    "year_desc": "Year (new→old)",
+    "added_desc": "Recently added",
+}
+
+SORT_ORDER_SQL = {
+    "title_asc": "title COLLATE NOCASE ASC",
+    "title_desc": "title COLLATE NOCASE DESC",
+    # NULL years sort last under DESC, so no COALESCE is needed and idx_movies_year applies.
+    "year_desc": "year DESC, title COLLATE NOCASE ASC",
+    # created_at is CURRENT_TIMESTAMP text, which sorts chronologically as-is (and can use the index)
+    "added_desc": "created_at DESC",
+}
+MOVIE_SEARCH_WHERE = (
+    "WHERE id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?)"
+    if fts5_available()
+    else "WHERE title LIKE ? ESCAPE '\\'"  # unindexed scan, but LIKE is already case-insensitive for ASCII
+)
 
+# One fixed SQL string per (sort, searching) pair: identical text every call hits sqlite3's statement cache.
+MOVIES_PAGE_SQL = {
+    (sort, searching): (
+        f"SELECT {MOVIE_SUMMARY_COLUMNS} FROM movies {MOVIE_SEARCH_WHERE if searching else ''} "
+        f"ORDER BY {order} LIMIT ? OFFSET ?"
+    )
+    for sort, order in SORT_ORDER_SQL.items()
+    for searching in (False, True)
+}
+
+MOVIES_COUNT_SQL = {
+    False: "SELECT COUNT(*) FROM movies",
+    True: f"SELECT COUNT(*) FROM movies {MOVIE_SEARCH_WHERE}",
+}
+
+@st.cache_data(ttl=300, max_entries=READ_CACHE_ENTRIES, show_spinner=False)
+def _cached_movies(uid: str, q: str, sort: str, limit: int, offset: int, mtime: int) -> List[Dict[str, Any]]:
+    searching = bool(q.strip())
+    sql = MOVIES_PAGE_SQL.get((sort, searching)) or MOVIES_PAGE_SQL[("title_asc", searching)]
+    params = [search_param(q)] if searching else []
+
+    # Rows go straight from the cursor into the cached dicts; no intermediate fetchall() list.
+    with db() as conn:  # never read (and cache) another session's uncommitted tx()
+        return [dict(r) for r in conn.execute(sql, [*params, limit, offset])]
+
+@st.cache_data(ttl=300, max_entries=READ_CACHE_ENTRIES, show_spinner=False)
+def _cached_movie_count(uid: str, q: str, mtime: int) -> int:
+    searching = bool(q.strip())
     with db() as conn:
-        return conn.execute(f"SELECT * FROM movies {where} {order}", params).fetchall()
+        return int(conn.execute(MOVIES_COUNT_SQL[searching], [search_param(q)] if searching else []).fetchone()[0])
 
-def get_movie(movie_id: int) -> Optional[sqlite3.Row]:
+def count_movies(q: str = "") -> int:
+    """How many movies match the search: sizes the Library pager."""
+    return _cached_movie_count(user_id, q, db_mtime())
+
+def get_movies_summary(q: str = "", sort: str = "title_asc", limit: int = LIBRARY_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+    """One page of what the Library cards render; the detail pane uses get_movie() for the full row."""
+    return _cached_movies(user_id, q, sort, limit, offset, db_mtime())
+
+@st.cache_data(ttl=300, max_entries=READ_CACHE_ENTRIES, show_spinner=False)
+def _cached_movie(uid: str, movie_id: int, mtime: int) -> Optional[Dict[str, Any]]:
     with db() as conn:
-        return conn.execute("SELECT * FROM movies WHERE id=?", (movie_id,)).fetchone()
+        row = conn.execute("SELECT * FROM movies WHERE id=?", (movie_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_movie(movie_id: int) -> Optional[Dict[str, Any]]:
+    return _cached_movie(user_id, movie_id, db_mtime())
 
 def update_movie(movie_id: int, **fields):
     if not fields:
@@ -398,42 +898,61 @@ def update_movie(movie_id: int, **fields):
     if not sets:
         return
     params.append(movie_id)
-    with db() as conn:
+    with tx() as conn:
         conn.execute(
             f"UPDATE movies SET {', '.join(sets)}, updated_at=CURRENT_TIMESTAMP WHERE id=?",
             params,
         )
+    clear_read_caches()
 
 def delete_movie(movie_id: int):
-    with db() as conn:
+    with tx() as conn:
         conn.execute("DELETE FROM movies WHERE id=?", (movie_id,))
+    clear_read_caches()
 
-def get_lists() -> List[sqlite3.Row]:
+@st.cache_data(ttl=300, max_entries=READ_CACHE_ENTRIES, show_spinner=False)
+def _cached_lists(uid: str, mtime: int) -> List[Dict[str, Any]]:
     with db() as conn:
-        return conn.execute("SELECT * FROM lists ORDER BY name COLLATE NOCASE ASC").fetchall()
+        return [dict(r) for r in conn.execute("SELECT * FROM lists ORDER BY name COLLATE NOCASE ASC")]
+
+def get_lists() -> List[Dict[str, Any]]:
+    return _cached_lists(user_id, db_mtime())
 
 def create_list(name: str):
-    with db() as conn:
+    with tx() as conn:
         conn.execute("INSERT INTO lists (name) VALUES (?)", (name.strip(),))
+    clear_read_caches()
 
 def add_to_list(list_id: int, movie_id: int):
-    with db() as conn:
-        maxpos = conn.execute(
-            "SELECT COALESCE(MAX(position), 0) FROM list_items WHERE list_id=?",
-            (list_id,),
-        ).fetchone()[0]
+    add_many_to_list(list_id, [movie_id])
+
+def add_many_to_list(list_id: int, movie_ids: List[int]):
+    """Append movies (in order) after the list's current last position, in one statement."""
+    ids = list(dict.fromkeys(int(m) for m in movie_ids))
+    if not ids:
+        return
+    with tx() as conn:
         conn.execute(
-            "INSERT OR IGNORE INTO list_items (list_id, movie_id, position) VALUES (?, ?, ?)",
-            (list_id, movie_id, int(maxpos) + 1),
+            """
+            WITH base AS (SELECT COALESCE(MAX(position), 0) AS p FROM list_items WHERE list_id=?)
+            INSERT OR IGNORE INTO list_items (list_id, movie_id, position)
+            SELECT ?, j.value, base.p + ROW_NUMBER() OVER (ORDER BY j.key)
+            FROM json_each(?) AS j, base
+            WHERE j.value NOT IN (SELECT movie_id FROM list_items WHERE list_id=?)
+            """,
+            (list_id, list_id, json.dumps(ids), list_id),
         )
+    clear_read_caches()
 
 def remove_from_list(list_id: int, movie_id: int):
-    with db() as conn:
+    with tx() as conn:
         conn.execute("DELETE FROM list_items WHERE list_id=? AND movie_id=?", (list_id, movie_id))
+    clear_read_caches()
 
-def get_list_items(list_id: int) -> List[sqlite3.Row]:
+@st.cache_data(ttl=300, max_entries=READ_CACHE_ENTRIES, show_spinner=False)
+def _cached_list_items(uid: str, list_id: int, mtime: int) -> List[Dict[str, Any]]:
     with db() as conn:
-        return conn.execute(
+        cur = conn.execute(
             """
             SELECT li.position, m.*
             FROM list_items li
@@ -442,176 +961,348 @@ def get_list_items(list_id: int) -> List[sqlite3.Row]:
             ORDER BY li.position ASC
             """,
             (list_id,),
-        ).fetchall()
+        )
+        return [dict(r) for r in cur]
+
+def get_list_items(list_id: int) -> List[Dict[str, Any]]:
+    return _cached_list_items(user_id, list_id, db_mtime())
 
 def move_item(list_id: int, movie_id: int, direction: str):
-    items = get_list_items(list_id)
-    idx = next((i for i, r in enumerate(items) if r["id"] == movie_id), None)
-    if idx is None:
-        return
-    if direction == "up" and idx > 0:
-        a = items[idx]
-        b = items[idx - 1]
-    elif direction == "down" and idx < len(items) - 1:
-        a = items[idx]
-        b = items[idx + 1]
+    """Swap an item with its neighbour: one SELECT for the pair, one UPDATE for the swap, one transaction."""
+    if direction == "up":
+        cmp, order = "<=", "DESC"
+    elif direction == "down":
+        cmp, order = ">=", "ASC"
     else:
         return
 
-    with db() as conn:
-        conn.execute(
-            "UPDATE list_items SET position=? WHERE list_id=? AND movie_id=?",
-            (b["position"], list_id, a["id"]),
-        )
+    with tx() as conn:
+        # The clicked row always sorts first, its neighbour (if any) second. Only rows get_list_items()
+        # shows count: items whose movie was deleted while foreign keys were off linger invisibly.
+        pair = conn.execute(
+            f"""
+            SELECT movie_id, position
+            FROM list_items
+            WHERE list_id=?
+              AND movie_id IN (SELECT id FROM movies)
+              AND position {cmp} (
+                  SELECT position FROM list_items
+                  WHERE list_id=? AND movie_id=? AND movie_id IN (SELECT id FROM movies)
+              )
+            ORDER BY position {order}
+            LIMIT 2
+            """,
+            (list_id, list_id, movie_id),
+        ).fetchall()
+        if len(pair) < 2:
+            return
+        a, b = pair
+
         conn.execute(
-            "UPDATE list_items SET position=? WHERE list_id=? AND movie_id=?",
-            (a["position"], list_id, b["id"]),
+            """
+            UPDATE list_items
+            SET position = CASE movie_id WHEN ? THEN ? WHEN ? THEN ? END
+            WHERE list_id=? AND movie_id IN (?, ?)
+            """,
+            (a["movie_id"], b["position"], b["movie_id"], a["position"], list_id, a["movie_id"], b["movie_id"]),
         )
+    clear_read_caches()
 
 # ---------------------------
 # Backup (Export/Import zip)
 # ---------------------------
-def make_backup_zip_bytes() -> bytes:
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
-        db_file = Path(DB_PATH)
-        posters_dir = Path(POSTERS_DIR)
-
-        if db_file.exists():
-            z.write(db_file, arcname="movies.db")
-
-        if posters_dir.exists():
-            for p in posters_dir.rglob("*"):
-                if p.is_file():
-                    z.write(p, arcname=str(Path("posters") / p.relative_to(posters_dir)))
-
-    return buf.getvalue()
-
-def restore_from_backup_zip(uploaded_bytes: bytes):
-    tmp_dir = Path(USER_DIR) / "_restore_tmp"
-    if tmp_dir.exists():
-        shutil.rmtree(tmp_dir)
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-
-    with zipfile.ZipFile(io.BytesIO(uploaded_bytes), "r") as z:
-        z.extractall(tmp_dir)
-
-    extracted_db = tmp_dir / "movies.db"
-    extracted_posters = tmp_dir / "posters"
-
-    if not extracted_db.exists():
-        shutil.rmtree(tmp_dir)
-        raise ValueError("Backup zip is missing movies.db")
-
-    os.makedirs(Path(DB_PATH).parent, exist_ok=True)
-    shutil.copy2(extracted_db, DB_PATH)
+def iter_files(root: str, arc_prefix: str) -> Iterable[Tuple[str, str, os.stat_result]]:
+    """(path, arcname, stat) for every file under root, walked with scandir (one stat per file)."""
+    with os.scandir(root) as it:
+        for entry in it:
+            arcname = f"{arc_prefix}/{entry.name}"
+            if entry.path == POSTER_BLOBS_DIR:
+                continue  # every blob is also reachable under a per-URL name; restore re-links them
+            if entry.name.endswith(".part"):
+                continue  # a download still being written; it lands under its final name (or not at all)
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path, arcname)
+            elif entry.is_file():
+                try:
+                    yield entry.path, arcname, entry.stat()
+                except FileNotFoundError:
+                    continue  # replaced or removed since the directory was listed
 
-    if os.path.exists(POSTERS_DIR):
-        shutil.rmtree(POSTERS_DIR)
-    os.makedirs(POSTERS_DIR, exist_ok=True)
+def backup_fingerprint() -> Tuple[int, int]:
+    """Changes whenever the DB or the set of posters does; a prepared backup older than this is stale."""
+    try:
+        posters_mtime = os.stat(POSTERS_DIR).st_mtime_ns
+    except OSError:
+        posters_mtime = 0
+    return db_mtime(), posters_mtime
+
+def make_backup_zip_file() -> str:
+    """Write the backup zip to disk (not RAM) and return its path."""
+    tmp = tempfile.NamedTemporaryFile(dir=USER_DIR, prefix="_backup_", suffix=".zip", delete=False)
+    try:
+        with tmp, zipfile.ZipFile(tmp, "w") as z:
+            db_file = Path(DB_PATH)
+            posters_dir = Path(POSTERS_DIR)
+
+            if db_file.exists():
+                # The cached connection keeps the WAL open; fold it into movies.db first. Held under the
+                # lock until copied, so no other session's commit (or its auto-checkpoint) lands mid-copy.
+                with db() as conn:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    # Level 1: SQLite pages are mostly free space and repeated text, so the fast level already shrinks them ~20x.
+                    z.write(db_file, arcname="movies.db", compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+
+            if posters_dir.exists():
+                # Posters are JPEGs (already entropy-coded): store them, don't deflate.
+                for path, arcname, st_ in iter_files(str(posters_dir), "posters"):
+                    info = zipfile.ZipInfo(arcname, date_time=time.localtime(st_.st_mtime)[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    info.file_size = st_.st_size
+                    info.external_attr = (st_.st_mode & 0xFFFF) << 16  # keep permissions, as z.write() did
+                    try:
+                        src = open(path, "rb")
+                    except FileNotFoundError:
+                        continue  # gone between the walk and now (e.g. a concurrent download's rename)
+                    with src, z.open(info, "w") as dst:
+                        shutil.copyfileobj(src, dst, length=1 << 20)
+
+        os.replace(tmp.name, BACKUP_ZIP_PATH)
+    except Exception:
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
+        raise
+    return BACKUP_ZIP_PATH
+
+def discard_prepared_backup():
+    """Drop the prepared zip (file and session keys); on_click for the download button."""
+    path = st.session_state.pop("backup_path", None)
+    st.session_state.pop("backup_fingerprint", None)
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+# Parents before children; list_items rows whose list or movie didn't make it are skipped, not an FK error.
+RESTORE_TABLES = [
+    ("movies", ""),
+    ("lists", ""),
+    ("list_items", "WHERE list_id IN (SELECT id FROM main.lists) AND movie_id IN (SELECT id FROM main.movies)"),
+]
+
+def restore_rows_from_db(backup_db: str):
+    """
+    Replace the live rows with the backup's, as one transaction on the cached connection.
+    Only columns both schemas share are copied, so backups from older versions restore too
+    (missing columns take their defaults) and the live schema, indexes and FTS triggers stay as they are.
+    """
+    # ATTACH .. DETACH is connection state every session would see: hold the lock across it.
+    with db() as conn:
+        conn.execute("ATTACH DATABASE ? AS bak", (backup_db,))  # ATTACH can't run inside a transaction
+        try:
+            bak_tables = {r[0] for r in conn.execute("SELECT name FROM bak.sqlite_master WHERE type='table'")}
+            if "movies" not in bak_tables:
+                raise ValueError("Backup movies.db has no movies table")
+
+            with tx():
+                for table, _ in reversed(RESTORE_TABLES):
+                    conn.execute(f"DELETE FROM main.{table}")
+                for table, where in RESTORE_TABLES:
+                    if table not in bak_tables:
+                        continue
+                    live_cols = [r["name"] for r in conn.execute(f"PRAGMA main.table_info({table})")]
+                    bak_cols = {r["name"] for r in conn.execute(f"PRAGMA bak.table_info({table})")}
+                    cols = ", ".join(c for c in live_cols if c in bak_cols)
+                    conn.execute(f"INSERT INTO main.{table} ({cols}) SELECT {cols} FROM bak.{table} {where}")
+        finally:
+            conn.execute("DETACH DATABASE bak")
+
+def restore_from_backup_zip(uploaded: Union[bytes, BinaryIO]):
+    """
+    Restore in a single pass over the zip: no extract-to-temp-then-copy.
+    Pass the uploaded file object itself; ZipFile seeks in it directly instead of a second in-RAM copy.
+    """
+    staged_db = os.path.join(USER_DIR, "_restore.db")
+    src_file = io.BytesIO(uploaded) if isinstance(uploaded, (bytes, bytearray)) else uploaded
+
+    with zipfile.ZipFile(src_file, "r") as z:
+        # Validate every entry before touching anything on disk.
+        names = z.namelist()
+        for name in names:
+            parts = name.replace("\\", "/").split("/")
+            if name.startswith(("/", "\\")) or ".." in parts or ":" in parts[0]:
+                raise ValueError(f"Backup zip contains an unsafe path: {name}")
+        if "movies.db" not in names:
+            raise ValueError("Backup zip is missing movies.db")
+
+        # ATTACH needs a file to read from, so only the DB is staged.
+        with z.open("movies.db") as src, open(staged_db, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
+        try:
+            restore_rows_from_db(staged_db)
+        finally:
+            for p in (staged_db, staged_db + "-wal", staged_db + "-shm"):
+                if os.path.exists(p):
+                    os.unlink(p)
+
+        if os.path.exists(POSTERS_DIR):
+            shutil.rmtree(POSTERS_DIR)
+        os.makedirs(POSTERS_DIR, exist_ok=True)
 
-    if extracted_posters.exists():
-        shutil.copytree(extracted_posters, POSTERS_DIR, dirs_exist_ok=True)
+        # Posters go straight to their final location (paths were validated above), de-duplicated
+        # by content again since the zip holds each per-URL name as its own entry.
+        for info in z.infolist():
+            if info.is_dir() or not info.filename.startswith("posters/"):
+                continue
+            rel = info.filename[len("posters/"):]
+            if rel.startswith(".by_hash/"):
+                continue  # blobs are rebuilt from the per-URL entries, never taken from the zip
+            target = os.path.join(POSTERS_DIR, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if info.file_size <= MAX_POSTER_BYTES:
+                store_poster_bytes(z.read(info), target)
+            else:
+                with z.open(info) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
 
-    shutil.rmtree(tmp_dir)
+    clear_read_caches()
+    load_poster.clear()
 
 # ---------------------------
 # UI setup
 # ---------------------------
 st.set_page_config(page_title=APP_TITLE, layout="wide")
 
-st.markdown(
-    """
-    <style>
-      html, body, [class*="css"]  { background-color: #000000 !important; color: #FFFFFF !important; }
-      .stApp { background-color: #000000; }
-      header { background: rgba(0,0,0,0) !important; }
-      div[data-testid="stSidebar"] { background-color: #000000; }
-
-      .stTextInput input,
-      .stTextArea textarea,
-      .stSelectbox div,
-      .stButton button,
-      .stRadio div {
-        background-color: #000000 !important;
-        color: #FFFFFF !important;
-        border: 1px solid #333333 !important;
-      }
-      .stButton button:hover { border: 1px solid #666666 !important; }
-
-      .muted { color: #BDBDBD; }
-      .card { border: 1px solid #222; border-radius: 12px; padding: 10px; background: #000; }
-
-      section[data-testid="stFileUploader"] > div {
-        background-color: #000000 !important;
-        border: 1px solid #333333 !important;
-      }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+# Colours come from the theme in .streamlit/config.toml; only what a theme can't express is injected.
+APP_CSS = """
+<style>
+  header { background: rgba(0,0,0,0) !important; }
+
+  .stTextInput input,
+  .stTextArea textarea,
+  .stSelectbox div,
+  .stButton button,
+  .stRadio div {
+    background-color: #000000 !important;
+    color: #FFFFFF !important;
+    border: 1px solid #333333 !important;
+  }
+  .stButton button:hover { border: 1px solid #666666 !important; }
+
+  .muted { color: #BDBDBD; }
+
+  section[data-testid="stFileUploader"] > div {
+    background-color: #000000 !important;
+    border: 1px solid #333333 !important;
+  }
+</style>
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 init_db()
 
 st.title("🎬 Movie Shelf")
 st.caption("Local. Private. Simple. (No account. Per-browser private library.)")
 
-tabs = st.tabs(["Library", "Lists", "Add", "Settings"])
+# A radio instead of st.tabs: tabs run every tab's body on each rerun, this runs only the section shown.
+SECTIONS = ["Library", "Lists", "Add", "Settings"]
+section = st.radio("Section", SECTIONS, horizontal=True, label_visibility="collapsed", key="section")
+
+# Streamlit drops the state of widgets a run doesn't render, so a hidden section would come back
+# reset (search, sort, picked list, half-filled Add forms). Re-assigning a key through the Session
+# State API keeps it until its widget is shown again. Buttons and uploaders can't be set, so aren't listed.
+SECTION_STATE_KEYS = {
+    "Library": ("search_library", "sort_library", "library_page"),
+    "Lists": ("lists_radio", "create_list_name"),
+    "Add": (
+        "add_mode", "scan_fmt", "scan_watched",
+        "add_title_manual", "add_year_manual", "add_plot_manual", "fmt_manual",
+        "add_watched_manual", "add_loc_manual", "add_notes_manual",
+        "omdb_query", "omdb_choice", "fmt_omdb", "watched_omdb", "loc_omdb", "notes_omdb",
+    ),
+}
+# The open movie's unsaved edits (keys carry the movie id).
+SECTION_STATE_PREFIXES = {
+    "Library": (
+        "detail_title_", "detail_year_", "detail_plot_", "fmt_detail_", "detail_watched_",
+        "detail_location_", "detail_notes_", "detail_addtolist_pick_",
+    ),
+}
+
+def keep_hidden_section_state(shown: str):
+    """Re-store the widget values of every section other than `shown`, so switching back restores them."""
+    for name in SECTIONS:
+        if name == shown:
+            continue
+        keys, prefixes = SECTION_STATE_KEYS.get(name, ()), SECTION_STATE_PREFIXES.get(name, ())
+        for k in list(st.session_state):
+            if k in keys or (prefixes and str(k).startswith(prefixes)):
+                st.session_state[k] = st.session_state[k]
+
+keep_hidden_section_state(section)
 
 # ---------------- Library ----------------
-with tabs[0]:
+# Fragments: searching, paging, opening a card or reordering a list reruns only that section.
+# Writes that other sections display (delete, save, add to list, create list) still call
+# st.rerun(), which is a full-app rerun.
+@st.fragment
+def render_library():
     colA, colB = st.columns([4, 1])
     with colA:
         q = st.text_input("Search", placeholder="Search titles…", label_visibility="collapsed", key="search_library")
     with colB:
         sort = st.selectbox(
             "Sort",
-            options=[
-                ("Title A→Z", "title_asc"),
-                ("Title Z→A", "title_desc"),
-                ("Year (new→old)", "year_desc"),
-                ("Recently added", "added_desc"),
-            ],
-            format_func=lambda x: x[0],
+            options=tuple(SORT_LABELS),
+            format_func=SORT_LABELS.__getitem__,
             index=0,
             label_visibility="collapsed",
             key="sort_library",
-        )[1]
+        )
 
-    movies = get_movies(q=q, sort=sort)
+    total = count_movies(q=q)
+    pages = max(1, -(-total // LIBRARY_PAGE_SIZE))
+    # Back to the first page whenever the search or sort changes; stay in range after deletes.
+    # (Both happen before the page widget below is created, so setting its key is allowed.)
+    if st.session_state.get("library_page_for") != (q, sort):
+        st.session_state["library_page_for"] = (q, sort)
+        st.session_state["library_page"] = 1
+    elif st.session_state.get("library_page", 1) > pages:
+        st.session_state["library_page"] = pages
+    page = int(st.session_state.get("library_page", 1))
+
+    movies = get_movies_summary(q=q, sort=sort, limit=LIBRARY_PAGE_SIZE, offset=(page - 1) * LIBRARY_PAGE_SIZE)
+    existing_posters = poster_files()
 
     if not movies:
-        st.markdown('<p class="muted">No movies yet. Use the Add tab.</p>', unsafe_allow_html=True)
+        st.markdown('<p class="muted">No movies yet. Use Add to get started.</p>', unsafe_allow_html=True)
     else:
         cols = st.columns(6)
         for i, m in enumerate(movies):
-            with cols[i % 6]:
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-
-                if m["poster_path"] and os.path.exists(m["poster_path"]):
-                    st.image(m["poster_path"], use_container_width=True)
+            # One bordered container + one markdown per card (a split <div> across two
+            # st.markdown calls never actually wrapped the card, it just cost two extra elements).
+            with cols[i % 6], st.container(border=True):
+                poster = poster_for(m["poster_path"], existing_posters)
+                if poster:
+                    st.image(poster, width="stretch")
                 else:
                     st.markdown('<p class="muted">No poster</p>', unsafe_allow_html=True)
 
                 title_line = m["title"]
                 if m["year"]:
                     title_line += f" ({m['year']})"
-                st.markdown(f"**{title_line}**")
-                st.markdown(
-                    f"<span class='muted'>{m['format']} · {'Watched' if m['watched'] else 'Unwatched'}</span>",
-                    unsafe_allow_html=True,
-                )
-
-                c1, c2 = st.columns(2)
-                with c1:
-                    if st.button("Open", key=f"open_{m['id']}"):
-                        st.session_state["open_movie_id"] = m["id"]
-                with c2:
-                    if st.button("Delete", key=f"del_{m['id']}"):
-                        delete_movie(m["id"])
-                        st.rerun()
-
-                st.markdown("</div>", unsafe_allow_html=True)
+                meta = f"{m['format']} · {'Watched' if m['watched'] else 'Unwatched'}"
+                if m["list_count"]:
+                    meta += f" · {m['list_count']} list{'s' if m['list_count'] > 1 else ''}"
+                st.markdown(f"**{title_line}**  \n<span class='muted'>{meta}</span>", unsafe_allow_html=True)
+
+                # One widget per card; Delete lives in the detail pane, so a big grid registers half the buttons.
+                if st.button("Open", key=f"open_{m['id']}", width="stretch"):
+                    st.session_state["open_movie_id"] = m["id"]
+
+    if pages > 1:
+        p1, p2 = st.columns([1, 5])
+        with p1:
+            st.number_input("Page", min_value=1, max_value=pages, step=1, key="library_page", label_visibility="collapsed")
+        with p2:
+            st.markdown(f'<p class="muted">of {pages} · {total} movies</p>', unsafe_allow_html=True)
 
     movie_id = st.session_state.get("open_movie_id")
     if movie_id:
@@ -619,11 +1310,15 @@ with tabs[0]:
         if m:
             st.divider()
             st.subheader("Movie")
+            flash = st.session_state.pop("library_flash", None)
+            if flash:
+                st.success(flash)
 
             left, right = st.columns([1, 2])
             with left:
-                if m["poster_path"] and os.path.exists(m["poster_path"]):
-                    st.image(m["poster_path"], use_container_width=True)
+                poster = poster_for(m["poster_path"], existing_posters)
+                if poster:
+                    st.image(poster, width="stretch")
                 else:
                     st.markdown('<p class="muted">No poster</p>', unsafe_allow_html=True)
 
@@ -652,7 +1347,7 @@ with tabs[0]:
                 new_location = st.text_input("Location (optional)", value=m["location"] or "", key=f"detail_location_{mid}")
                 new_notes = st.text_area("Notes (optional)", value=m["notes"] or "", height=100, key=f"detail_notes_{mid}")
 
-                c1, c2, c3 = st.columns([1, 1, 2])
+                c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
                 with c1:
                     if st.button("Save changes", key=f"save_{mid}"):
                         update_movie(
@@ -665,12 +1360,19 @@ with tabs[0]:
                             location=new_location.strip() or None,
                             notes=new_notes.strip() or None,
                         )
-                        st.success("Saved.")
+                        # Full rerun so cards and lists pick up the edit; the message survives it.
+                        st.session_state["library_flash"] = "Saved."
+                        st.rerun()
                 with c2:
                     if st.button("Close", key=f"close_{mid}"):
                         st.session_state["open_movie_id"] = None
                         st.rerun()
                 with c3:
+                    if st.button("Delete", key=f"del_{mid}"):
+                        delete_movie(mid)
+                        st.session_state["open_movie_id"] = None
+                        st.rerun()
+                with c4:
                     lists_ = get_lists()
                     if lists_:
                         list_choice = st.selectbox(
@@ -681,12 +1383,17 @@ with tabs[0]:
                         if list_choice != "—" and st.button("Add", key=f"detail_addtolist_btn_{mid}"):
                             chosen = next(l for l in lists_ if l["name"] == list_choice)
                             add_to_list(chosen["id"], mid)
-                            st.success(f"Added to {list_choice}.")
+                            st.session_state["library_flash"] = f"Added to {list_choice}."
+                            st.rerun()
         else:
             st.session_state["open_movie_id"] = None
 
+if section == "Library":
+    render_library()
+
 # ---------------- Lists ----------------
-with tabs[1]:
+@st.fragment
+def render_lists():
     st.subheader("Lists")
     col1, col2 = st.columns([2, 3])
 
@@ -714,14 +1421,16 @@ with tabs[1]:
         if selected:
             st.write(f"### {selected['name']}")
             items = get_list_items(selected["id"])
+            existing_posters = poster_files()
             if not items:
                 st.markdown('<p class="muted">This list is empty.</p>', unsafe_allow_html=True)
             else:
                 for r in items:
                     row = st.columns([1, 3, 1, 1, 1])
                     with row[0]:
-                        if r["poster_path"] and os.path.exists(r["poster_path"]):
-                            st.image(r["poster_path"], width=70)
+                        poster = poster_for(r["poster_path"], existing_posters)
+                        if poster:
+                            st.image(poster, width=70)
                         else:
                             st.markdown('<span class="muted">—</span>', unsafe_allow_html=True)
                     with row[1]:
@@ -729,21 +1438,19 @@ with tabs[1]:
                         if r["year"]:
                             t += f" ({r['year']})"
                         st.markdown(f"**{t}**  \n<span class='muted'>{r['format']}</span>", unsafe_allow_html=True)
+                    # Callbacks run before the (fragment) rerun, so the rows below already show the new order.
                     with row[2]:
-                        if st.button("↑", key=f"up_{selected['id']}_{r['id']}"):
-                            move_item(selected["id"], r["id"], "up")
-                            st.rerun()
+                        st.button("↑", key=f"up_{selected['id']}_{r['id']}", on_click=move_item, args=(selected["id"], r["id"], "up"))
                     with row[3]:
-                        if st.button("↓", key=f"down_{selected['id']}_{r['id']}"):
-                            move_item(selected["id"], r["id"], "down")
-                            st.rerun()
+                        st.button("↓", key=f"down_{selected['id']}_{r['id']}", on_click=move_item, args=(selected["id"], r["id"], "down"))
                     with row[4]:
-                        if st.button("Remove", key=f"rm_{selected['id']}_{r['id']}"):
-                            remove_from_list(selected["id"], r["id"])
-                            st.rerun()
+                        st.button("Remove", key=f"rm_{selected['id']}_{r['id']}", on_click=remove_from_list, args=(selected["id"], r["id"]))
+
+if section == "Lists":
+    render_lists()
 
 # ---------------- Add ----------------
-with tabs[2]:
+if section == "Add":
     st.subheader("Add")
 
     mode = st.radio(
@@ -854,16 +1561,21 @@ with tabs[2]:
             st.warning("OMDb mode needs an API key. Add OMDB_API_KEY in Streamlit Secrets (or env var) and restart.")
 
         query = st.text_input("Search title", key="omdb_query")
-        results = omdb_search(query) if query.strip() and OMDB_API_KEY else []
+        # OMDb answers 1-2 letter searches with "Too many results." anyway; don't spend quota on them.
+        searchable = len(query.strip()) >= OMDB_MIN_QUERY
+        results = omdb_search(query.strip()) if searchable and OMDB_API_KEY else []
 
-        if query.strip() and OMDB_API_KEY and not results:
-            st.markdown('<p class="muted">No results.</p>', unsafe_allow_html=True)
+        if query.strip() and not searchable:
+            st.markdown(f'<p class="muted">Type at least {OMDB_MIN_QUERY} characters.</p>', unsafe_allow_html=True)
+        elif searchable and OMDB_API_KEY and not results:
+            st.markdown('<p class="muted">No results (or too many: try a longer title).</p>', unsafe_allow_html=True)
 
         if results:
-            labels = [f"{t} ({y})" for (t, y, _id) in results]
-            choice = st.selectbox("Matches", labels, key="omdb_choice")
-            idx = labels.index(choice)
-            imdb_id = results[idx][2]
+            hits: Dict[str, Tuple[str, str]] = {}
+            for t, y, _id, _poster in results:
+                hits.setdefault(f"{t} ({y})", (_id, _poster))  # same label twice: first hit wins, as before
+            choice = st.selectbox("Matches", list(hits), key="omdb_choice")
+            imdb_id, poster_hint = hits[choice]
 
             fmt = st.selectbox("Format", ["DVD", "Blu-ray", "4K"], index=1, key="fmt_omdb")
             watched = st.checkbox("Watched", value=False, key="watched_omdb")
@@ -871,7 +1583,14 @@ with tabs[2]:
             notes = st.text_area("Notes (optional)", height=90, key="notes_omdb")
 
             if st.button("Add to Library (with poster)", key="add_btn_omdb"):
+                # The search hit already carries the poster URL (normally the same one omdb_get returns):
+                # fetch it alongside the details instead of after them.
+                poster_prefetch = None
+                if poster_hint and poster_hint != "N/A":
+                    poster_prefetch = io_pool().submit(download_poster, poster_hint, http_session())
                 meta = omdb_get(imdb_id)
+                if poster_prefetch is not None:
+                    poster_prefetch.result()  # add_movie() then finds the file already on disk
                 if not meta or not meta.title:
                     st.error("Could not fetch details.")
                 else:
@@ -891,25 +1610,40 @@ with tabs[2]:
                     st.rerun()
 
 # ---------------- Settings ----------------
-with tabs[3]:
+if section == "Settings":
     st.subheader("Settings")
     st.markdown("<p class='muted'>Per-browser private library. No account required.</p>", unsafe_allow_html=True)
 
     st.write("### Backup")
-    backup_bytes = make_backup_zip_bytes()
-    st.download_button(
-        "Export Backup (.zip)",
-        data=backup_bytes,
-        file_name="movie_shelf_backup.zip",
-        mime="application/zip",
-        key="export_backup",
-    )
+    # Zipping walks every poster, so only do it when asked (not on every rerun).
+    if st.button("Prepare Backup", key="prepare_backup"):
+        st.session_state["backup_path"] = make_backup_zip_file()
+        st.session_state["backup_fingerprint"] = backup_fingerprint()  # after the build: it checkpoints the WAL
+
+    backup_path = st.session_state.get("backup_path")
+    if backup_path and st.session_state.get("backup_fingerprint") != backup_fingerprint():
+        # The library changed after the zip was built; don't hand out an out-of-date copy.
+        st.markdown('<p class="muted">Library changed since the backup was prepared. Prepare it again.</p>', unsafe_allow_html=True)
+        discard_prepared_backup()
+        backup_path = None
+    if backup_path and os.path.exists(backup_path):
+        with open(backup_path, "rb") as backup_file:
+            # Once downloaded the zip (on disk, and in the button's media buffer) is dropped;
+            # otherwise every rerun would keep re-registering the whole archive.
+            st.download_button(
+                "Export Backup (.zip)",
+                data=backup_file,
+                file_name="movie_shelf_backup.zip",
+                mime="application/zip",
+                key="export_backup",
+                on_click=discard_prepared_backup,
+            )
 
     st.write("### Restore")
     uploaded = st.file_uploader("Import Backup (.zip)", type=["zip"], key="import_uploader")
     if uploaded is not None:
         try:
-            restore_from_backup_zip(uploaded.read())
+            restore_from_backup_zip(uploaded)
             st.success("Restored! Reloading…")
             st.rerun()
         except Exception as e: